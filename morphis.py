@@ -1,4 +1,5 @@
 import math
+import sys
 from os.path import isfile
 from decimal import Decimal
 import decimal
@@ -117,37 +118,48 @@ def get_word_cases_in_one_line(input_words: str) -> Dict[grammar_category.Case,
 
 
 def find_morphosyntactic() -> str:
-    """Finds file with morphosyntactic dictionary"""
-    if isfile("polimorfologik-2.1.txt"):
-        return "polimorfologik-2.1.txt"
-    else:
-        path = ""
-        while not isfile(path):
-            print("Pobierz słownik morfosyntaktyczny"
-                  "https://github.com/morfologik/polimorfologik/releases/tag/2.1"
-                  "i podaj ścieżkę do niego", sep="\n")
-            path = input().rstrip("\n").strip('"')
-        return path
+    """Finds file with morphosyntactic dictionary, either extracted or still packed"""
+    for path in ["polimorfologik-2.1.txt", "polimorfologik-2.1.zip",
+                 "polimorfologik-2.1.txt.gz", "polimorfologik-2.1.txt.xz"]:
+        if isfile(path):
+            return path
+    path = ""
+    while not isfile(path):
+        print("Pobierz słownik morfosyntaktyczny"
+              "https://github.com/morfologik/polimorfologik/releases/tag/2.1"
+              "i podaj ścieżkę do niego (nie trzeba go rozpakowywać)", sep="\n")
+        path = input().rstrip("\n").strip('"')
+    return path
 
 
 def find_ngrams(n: int) -> str:
-    """Find file with n-grams"""
-    if isfile("{}grams".format(n)):
-        return "{}grams".format(n)
-    else:
-        path = ""
-        while not isfile(path):
-            print("Pobierz plik {}grams.gz".format(n),
-                  "http://zil.ipipan.waw.pl/NKJPNGrams",
-                  "rozpakuj i podaj ścieżkę do pliku {}grams".format(n), sep="\n")
-            path = input().rstrip("\n").strip('"')
-        return path
+    """Find file with n-grams, either extracted or still packed"""
+    for path in ["{}grams".format(n), "{}grams.gz".format(n)]:
+        if isfile(path):
+            return path
+    path = ""
+    while not isfile(path):
+        print("Pobierz plik {}grams.gz".format(n),
+              "http://zil.ipipan.waw.pl/NKJPNGrams",
+              "i podaj ścieżkę do niego (nie trzeba go rozpakowywać)", sep="\n")
+        path = input().rstrip("\n").strip('"')
+    return path
+
+
+def read_hot_forms_limit() -> Optional[int]:
+    """Reads number of forms kept in memory from command line (e.g. python morphis.py 50000),
+    without it whole dictionary is kept in memory"""
+    if len(sys.argv) > 1:
+        return int(sys.argv[1])
+    return None
 
 
 if __name__ == "__main__":
     are_you_human()
     morph_path = find_morphosyntactic()
-    morph = morphosyntactic.Morphosyntactic(morph_path)
+    hot_forms_limit = read_hot_forms_limit()
+    frequency_list_path = find_ngrams(1) if hot_forms_limit is not None else None
+    morph = morphosyntactic.Morphosyntactic(morph_path, hot_forms_limit, frequency_list_path)
     morph.create_morphosyntactic_dictionary()
     chosen_words = None
 
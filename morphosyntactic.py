@@ -1,13 +1,31 @@
+import gzip
+import heapq
+import io
+import itertools
+import lzma
+import os
+import sqlite3
 import sys
+import tempfile
+import zipfile
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from os.path import getmtime, isfile
 from typing import (
+    Callable,
+    Dict,
+    Iterator,
     List,
+    Optional,
     Set,
+    TextIO,
     Tuple
 )
 import grammar_category
 
 CONSOLE_WIDTH = 80
 DICT_LEN = 4811854
+PROMOTION_THRESHOLD = 3
 
 
 def progress_bar(console_width=CONSOLE_WIDTH):
@@ -26,6 +44,232 @@ def progress_bar(console_width=CONSOLE_WIDTH):
     return print_progress
 
 
+@contextmanager
+def open_dictionary_file(path: str) -> Iterator[TextIO]:
+    """Opens dictionary as text file, decompressing it on the fly
+    if it is still packed in .zip, .gz or .xz archive"""
+    if path.endswith(".gz"):
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            yield file
+    elif path.endswith(".xz"):
+        with lzma.open(path, "rt", encoding="utf-8") as file:
+            yield file
+    elif path.endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            members = [info for info in archive.infolist() if info.filename.endswith(".txt")]
+            if not members:
+                raise ValueError("Archive {0} does not contain .txt dictionary file".format(path))
+            member = max(members, key=lambda info: info.file_size)  # skips README files
+            with io.TextIOWrapper(archive.open(member), encoding="utf-8") as file:
+                yield file
+    else:
+        with open(path, "r", encoding="utf-8") as file:
+            yield file
+
+
+FormStatistics = namedtuple(typename="FormStatistics", field_names="meanings base_words parts_of_speech acronyms")
+
+
+def compute_form_statistics(raw_meanings: List[Tuple[str, str, Tuple]]) -> FormStatistics:
+    """Summarizes raw meanings of one form without creating AmbiguousWord,
+    meanings are counted the same way AmbiguousWord splits them (by part of speech and gender),
+    acronyms are base words written ALL UPPERCASE (e.g. PIT)"""
+    meanings = 0
+    base_words = set()
+    parts_of_speech = set()
+    acronyms = set()
+    for word, base_word, tags in raw_meanings:
+        split_tags = [tag.split(":") for tag in tags]
+        meanings += len({(tag[0], tag[3] if tag[0] in AmbiguousWord.noun_types else None) for tag in split_tags})
+        base_words.add(base_word)
+        parts_of_speech.update(tag[0] for tag in split_tags)
+        if base_word.isupper() and len(base_word) > 1:
+            acronyms.add(base_word)
+    return FormStatistics(meanings, len(base_words), len(parts_of_speech), len(acronyms))
+
+
+def should_skip(statistics: FormStatistics, max_meanings: Optional[int]) -> bool:
+    """Form should never be replaced if it is known only as acronym (e.g. PIT)
+    or has more meanings than max_meanings (None means no limit)"""
+    only_acronyms = statistics.acronyms == statistics.base_words
+    too_many_meanings = max_meanings is not None and statistics.meanings > max_meanings
+    return only_acronyms or too_many_meanings
+
+
+def read_frequent_forms(frequency_list_path: str, limit: int,
+                        is_known_form: Optional[Callable[[str], bool]] = None) -> List[str]:
+    """Reads at most limit most frequent forms from frequency list (e.g. NKJP 1grams) sorted from the most frequent,
+    where each line contains form, optionally preceded by its count,
+    counts of forms differing only by letter case are summed, reading stops at first new form over the limit,
+    forms rejected by is_known_form (e.g. punctuation missing from dictionary) are not counted"""
+    counts = {}  # type: Dict[str, int]
+    with open_dictionary_file(frequency_list_path) as file:
+        for line_number, line in enumerate(file):
+            fields = line.split()
+            if not fields:
+                continue
+            form = fields[-1].lower()
+            if form not in counts:
+                if len(counts) >= limit:
+                    break
+                if is_known_form is not None and not is_known_form(form):
+                    continue
+                counts[form] = 0 if len(fields) > 1 else -line_number
+            if len(fields) > 1:
+                counts[form] += int(fields[0])
+    return sorted(counts, key=lambda form: counts[form], reverse=True)
+
+
+class DiskDictionary:
+    """Stores morphosyntactic dictionary and form statistics in SQLite file indexed by lowercase form,
+    index takes about 1.4 times as much disk space as extracted dictionary file"""
+    def __init__(self, index_path: str):
+        self.connection = sqlite3.connect(index_path)
+
+    def raw_meanings(self, form: str) -> Optional[List[Tuple[str, str, Tuple]]]:
+        """Returns raw meanings of given lowercase form, in the same order as in dictionary file"""
+        rows = self.connection.execute(
+            "SELECT word, base_word, tags FROM entries WHERE form = ? ORDER BY position", (form,)).fetchall()
+        if not rows:
+            return None
+        return [(form if word is None else word, form if base_word is None else base_word, tuple(tags.split("+")))
+                for word, base_word, tags in rows]
+
+    def contains(self, form: str) -> bool:
+        """Checks whether given lowercase form is in dictionary"""
+        return self.connection.execute("SELECT 1 FROM entries WHERE form = ? LIMIT 1", (form,)).fetchone() is not None
+
+    def skipped_forms(self, max_meanings: Optional[int]) -> Set[str]:
+        """Returns forms which should never be replaced, based on precomputed statistics"""
+        rows = self.connection.execute(
+            "SELECT form, meanings, base_words, parts_of_speech, acronyms FROM forms "
+            "WHERE acronyms > 0 OR meanings > ?", (max_meanings,))
+        return {form for form, *statistics in rows if should_skip(FormStatistics(*statistics), max_meanings)}
+
+    @staticmethod
+    def create(entries: Iterator[Tuple[str, str, str]], index_path: str):
+        """Writes dictionary entries into new index file, clustered by form, then computes statistics of forms,
+        word and base word equal to lowercase form are stored as NULL, statistics are stored only for forms
+        with more than one meaning or with acronyms (other forms are never skipped),
+        file is renamed to index_path only when complete"""
+        temporary_path = index_path + ".tmp"
+        if isfile(temporary_path):
+            os.remove(temporary_path)
+        connection = sqlite3.connect(temporary_path)
+        with connection:
+            connection.execute("CREATE TEMP TABLE unsorted_entries "
+                               "(form TEXT, position INTEGER, word TEXT, base_word TEXT, tags TEXT)")
+            connection.executemany("INSERT INTO unsorted_entries VALUES (?, ?, ?, ?, ?)", (
+                (word.lower(), position, None if word == word.lower() else word,
+                 None if base_word == word.lower() else base_word, tags)
+                for position, (word, base_word, tags) in enumerate(entries)))
+            connection.execute("CREATE TABLE entries (form TEXT, position INTEGER, word TEXT, base_word TEXT, "
+                               "tags TEXT, PRIMARY KEY (form, position)) WITHOUT ROWID")
+            connection.execute("INSERT INTO entries SELECT * FROM unsorted_entries ORDER BY form, position")
+            connection.execute("DROP TABLE unsorted_entries")
+            connection.execute("CREATE TABLE forms (form TEXT PRIMARY KEY, meanings INTEGER, base_words INTEGER, "
+                               "parts_of_speech INTEGER, acronyms INTEGER) WITHOUT ROWID")
+            rows = connection.execute("SELECT form, word, base_word, tags FROM entries ORDER BY form, position")
+            statistics = (
+                (form, compute_form_statistics([(form if word is None else word,
+                                                 form if base_word is None else base_word,
+                                                 tuple(tags.split("+")))
+                                                for _, word, base_word, tags in form_rows]))
+                for form, form_rows in itertools.groupby(rows, key=lambda row: row[0]))
+            connection.executemany("INSERT INTO forms VALUES (?, ?, ?, ?, ?)", (
+                (form,) + form_statistics for form, form_statistics in statistics
+                if form_statistics.meanings > 1 or form_statistics.acronyms > 0))
+        connection.close()
+        os.replace(temporary_path, index_path)
+
+
+class TieredDictionary:
+    """Read-only dictionary keeping limited number of forms in memory and loading all other forms from disk,
+    forms loaded from disk often enough are promoted to memory in place of the least used ones"""
+    def __init__(self, load_from_disk: Callable[[str], Optional[object]], hot_forms_limit: int):
+        self.load_from_disk = load_from_disk
+        self.hot_forms_limit = hot_forms_limit
+        self.hot_forms = {}  # type: Dict[str, object]
+        self.hot_counters = {}  # type: Dict[str, float]
+        self.hot_heap = []  # type: List[Tuple[float, str]]  # one entry per hot form, its count may be outdated
+        self.cold_counters = Counter()  # type: Counter
+
+    def __contains__(self, form: str) -> bool:
+        return self.get(form) is not None
+
+    def __getitem__(self, form: str):
+        value = self.get(form)
+        if value is None:
+            raise KeyError(form)
+        return value
+
+    def get(self, form: str, default=None):
+        """Returns value from memory if possible, otherwise reads it from disk"""
+        if form in self.hot_forms:
+            self.hot_counters[form] += 1
+            return self.hot_forms[form]
+        value = self.load_from_disk(form)
+        if value is None:
+            return default
+        self.cold_counters[form] += 1
+        self.promote(form, value)
+        return value
+
+    def preload(self, forms: List[str]):
+        """Loads given forms, sorted from the most frequent, into memory until limit is reached,
+        their counters are seeded above PROMOTION_THRESHOLD and decrease with rank"""
+        for rank, form in enumerate(forms):
+            if len(self.hot_forms) >= self.hot_forms_limit:
+                break
+            value = self.load_from_disk(form)
+            if value is not None:
+                self.add_hot_form(form, value, PROMOTION_THRESHOLD + 1 - rank / len(forms))
+
+    def add_hot_form(self, form: str, value, count: float):
+        """Stores form in memory with given access counter"""
+        self.hot_forms[form] = value
+        self.hot_counters[form] = count
+        heapq.heappush(self.hot_heap, (count, form))
+
+    def coldest_hot_form(self) -> Tuple[float, str]:
+        """Returns the least used form in memory, refreshing outdated heap entries on the way"""
+        while True:
+            count, form = self.hot_heap[0]
+            if self.hot_counters[form] == count:
+                return count, form
+            heapq.heapreplace(self.hot_heap, (self.hot_counters[form], form))
+
+    def promote(self, form: str, value):
+        """Keeps form in memory if there is free space or it is used more often than the least used form in memory"""
+        count = self.cold_counters[form]
+        if len(self.hot_forms) < self.hot_forms_limit:
+            del self.cold_counters[form]
+            self.add_hot_form(form, value, count)
+        elif self.hot_forms and count >= PROMOTION_THRESHOLD:
+            coldest_count, coldest_form = self.coldest_hot_form()
+            if count > coldest_count:
+                heapq.heappop(self.hot_heap)
+                del self.hot_forms[coldest_form]
+                self.cold_counters[coldest_form] = self.hot_counters.pop(coldest_form)
+                del self.cold_counters[form]
+                self.add_hot_form(form, value, count)
+        if len(self.cold_counters) > 2 * max(self.hot_forms_limit, 1):
+            self.decay_counters()
+
+    def decay_counters(self):
+        """Halves counters of forms on disk until there are at most hot_forms_limit of them,
+        forgetting forms used only once since last decay,
+        counters of forms in memory are halved as well, so forms used only long ago can be evicted"""
+        while True:
+            self.cold_counters = Counter({form: count // 2 for form, count in self.cold_counters.items()
+                                          if count >= 2})
+            self.hot_counters = {form: count / 2 for form, count in self.hot_counters.items()}
+            if len(self.cold_counters) <= self.hot_forms_limit:
+                break
+        self.hot_heap = [(count, form) for form, count in self.hot_counters.items()]
+        heapq.heapify(self.hot_heap)
+
+
 class Meaning:
     """Represents one of possible meanings of given word,
     where meaning is map from given word to base word,
@@ -202,29 +446,73 @@ class AmbiguousWord:
 
 
 class Morphosyntactic:
-    """Stores morphosyntactic dictionary"""
-    def __init__(self, dictionary_file_path):
+    """Stores morphosyntactic dictionary and set of forms which should never be replaced,
+    if hot_forms_limit is given, only that many forms are kept in memory and the rest is read from index on disk,
+    if max_meanings is given, forms with more meanings are also never replaced"""
+    def __init__(self, dictionary_file_path, hot_forms_limit: Optional[int] = None,
+                 frequency_list_path: Optional[str] = None, max_meanings: Optional[int] = None):
+        if max_meanings is not None and max_meanings < 1:
+            raise ValueError("max_meanings must be at least 1, every form has at least one meaning")
         self.morphosyntactic_dictionary = {}
+        self.skipped_forms = set()  # type: Set[str]
         self.dictionary_file_path = dictionary_file_path
+        self.hot_forms_limit = hot_forms_limit
+        self.frequency_list_path = frequency_list_path
+        self.max_meanings = max_meanings
 
-    def create_morphosyntactic_dictionary(self):
-        """Creates dictionary representation from file"""
-        with open(self.dictionary_file_path, 'r', encoding='utf-8') as file:
+    def read_entries(self) -> Iterator[Tuple[str, str, str]]:
+        """Reads (word, base_word, tags) entries from file (or archive with file) line by line"""
+        with open_dictionary_file(self.dictionary_file_path) as file:
             print("Tworzenie słownika morfosyntaktycznego:")
             print_progress = progress_bar()
-            for line_number, line in enumerate(file.readlines()):
+            for line_number, line in enumerate(file):
                 if line_number % 1000 == 0:
                     progress = line_number / DICT_LEN
                     print_progress(progress)
                 base_word, word, tags = line.rstrip("\n").split(";")
-                tags = tuple(tags.split("+"))
-                if word.lower() in self.morphosyntactic_dictionary:
-                    self.morphosyntactic_dictionary[word.lower()].append((word, base_word, tags))
-                else:
-                    self.morphosyntactic_dictionary[word.lower()] = [(word, base_word, tags)]
+                yield word, base_word, tags
             print("\n")
+
+    def create_morphosyntactic_dictionary(self):
+        """Creates dictionary representation from file (or archive with file)"""
+        if self.hot_forms_limit is not None:
+            return self.create_tiered_dictionary()
+        acronym_forms = set()
+        for word, base_word, tags in self.read_entries():
+            tags = tuple(tags.split("+"))
+            if word.lower() in self.morphosyntactic_dictionary:
+                self.morphosyntactic_dictionary[word.lower()].append((word, base_word, tags))
+            else:
+                self.morphosyntactic_dictionary[word.lower()] = [(word, base_word, tags)]
+            if base_word.isupper() and len(base_word) > 1:
+                acronym_forms.add(word.lower())
+        self.create_skipped_forms(acronym_forms)
+        return self.morphosyntactic_dictionary
+
+    def create_tiered_dictionary(self):
+        """Creates dictionary with most frequent forms in memory and other forms in index file,
+        index file is created next to dictionary file on first use and recreated when dictionary file is newer"""
+        index_path = self.dictionary_file_path + ".sqlite"
+        if not isfile(index_path) or getmtime(index_path) < getmtime(self.dictionary_file_path):
+            DiskDictionary.create(self.read_entries(), index_path)
+        disk_dictionary = DiskDictionary(index_path)
+        self.morphosyntactic_dictionary = TieredDictionary(disk_dictionary.raw_meanings, self.hot_forms_limit)
+        self.skipped_forms = disk_dictionary.skipped_forms(self.max_meanings)
+        if self.frequency_list_path is not None:
+            frequent_forms = read_frequent_forms(self.frequency_list_path, self.hot_forms_limit,
+                                                 disk_dictionary.contains)
+            self.morphosyntactic_dictionary.preload(frequent_forms)
         return self.morphosyntactic_dictionary
 
+    def create_skipped_forms(self, acronym_forms: Set[str]):
+        """Computes statistics of forms which may be skipped and keeps only forms which should never be replaced,
+        without max_meanings only forms with acronyms (collected while loading dictionary) need to be checked"""
+        candidate_forms = self.morphosyntactic_dictionary if self.max_meanings is not None else acronym_forms
+        self.skipped_forms = {form for form in candidate_forms
+                              if should_skip(compute_form_statistics(self.morphosyntactic_dictionary[form]),
+                                             self.max_meanings)}
+        return self.skipped_forms
+
 
 if __name__ == "__main__":
     morph = Morphosyntactic("polimorfologik-2.1.txt")
@@ -233,6 +521,29 @@ if __name__ == "__main__":
         'ger:sg:nom:n2:imperf:aff:refl.nonrefl'.split(":"),
         'ger:sg:acc:n2:imperf:aff:refl.nonrefl'.split(":")
     ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        frequency_list_path = os.path.join(directory, "1grams")
+        with open(frequency_list_path, "w", encoding="utf-8") as frequency_file:
+            frequency_file.write("10 hak\n5 mamut\n4 Mamut\n3 HAK\n2 picie\n1 pić\n")
+        print(read_frequent_forms(frequency_list_path, 2))
+        assert read_frequent_forms(frequency_list_path, 2) == ["hak", "mamut"]
+        assert read_frequent_forms(frequency_list_path, 3) == ["hak", "mamut", "picie"]
+        assert read_frequent_forms(frequency_list_path, 2, lambda form: form != "mamut") == ["hak", "picie"]
+
+    tiered = TieredDictionary(lambda form: [form], 2)
+    tiered.preload(["hak", "mamut", "picie"])
+    assert set(tiered.hot_forms) == {"hak", "mamut"}
+    for _ in range(PROMOTION_THRESHOLD):
+        assert tiered["pić"] == ["pić"]
+    assert set(tiered.hot_forms) == {"hak", "mamut"}
+    tiered["pić"]
+    assert set(tiered.hot_forms) == {"hak", "pić"}
+    assert "mamut" in tiered.cold_counters
+    tiered.decay_counters()
+    assert tiered.hot_counters == {"hak": (PROMOTION_THRESHOLD + 1) / 2, "pić": (PROMOTION_THRESHOLD + 1) / 2}
+    assert tiered.coldest_hot_form() == ((PROMOTION_THRESHOLD + 1) / 2, "hak")
+
     morph.create_morphosyntactic_dictionary()
     d = morph.morphosyntactic_dictionary
     print(d["pić"])
@@ -245,6 +556,27 @@ if __name__ == "__main__":
                           ('picie', 'pita', ('subst:sg:dat:f', 'subst:sg:loc:f')),
                           ('picie', 'pić', ('ger:sg:nom.acc:n2:imperf:aff:refl.nonrefl',))]
 
+    print(compute_form_statistics(d["picie"]))
+    assert compute_form_statistics(d["picie"]) == FormStatistics(meanings=4, base_words=4, parts_of_speech=2, acronyms=1)
+    assert compute_form_statistics(d["picie"]).meanings == len(AmbiguousWord("picie", d["picie"]).meanings)
+    assert "picie" not in morph.skipped_forms
+    assert should_skip(FormStatistics(meanings=1, base_words=1, parts_of_speech=1, acronyms=1), None)
+    assert should_skip(FormStatistics(meanings=4, base_words=4, parts_of_speech=2, acronyms=1), 3)
+
+    with tempfile.TemporaryDirectory() as directory:
+        sample_dictionary_path = os.path.join(directory, "sample.txt")
+        sample_forms = ["picie", "pić", "pit"]
+        with open(sample_dictionary_path, "w", encoding="utf-8") as sample_dictionary_file:
+            for sample_form in sample_forms:
+                for word, base_word, tags in d[sample_form]:
+                    sample_dictionary_file.write("{0};{1};{2}\n".format(base_word, word, "+".join(tags)))
+        tiered_morph = Morphosyntactic(sample_dictionary_path, hot_forms_limit=1)
+        tiered_morph.create_morphosyntactic_dictionary()
+        assert tiered_morph.morphosyntactic_dictionary["picie"] == d["picie"]
+        assert tiered_morph.morphosyntactic_dictionary["pić"] == d["pić"]
+        assert "xyzzy" not in tiered_morph.morphosyntactic_dictionary
+        assert tiered_morph.skipped_forms == {form for form in sample_forms if form in morph.skipped_forms}
+
     sample_meaning = AmbiguousWord("pić", d["pić"]).meanings[0]
     print(sample_meaning)
     assert ['subst', 'pl', 'gen', 'n2'] in sample_meaning.unfiltered_tags
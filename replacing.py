@@ -41,8 +41,11 @@ class Replacing:
         """Replaces every noun in copypasta with matching form of one of replacement words"""
         for token_idx, token in enumerate(self.pasta[:]):
             if token.isalnum():
-                if token.lower() in self.morph.morphosyntactic_dictionary:
-                    raw_word = self.morph.morphosyntactic_dictionary[token.lower()]
+                if token.lower() in self.morph.skipped_forms:
+                    self.update_iteration_data()
+                    continue
+                raw_word = self.morph.morphosyntactic_dictionary.get(token.lower())
+                if raw_word is not None:
                     self.current_word = morphosyntactic.AmbiguousWord(token, raw_word)
                     if self.current_word.certain_noun():
                         self.select_meaning()
@@ -88,7 +91,7 @@ class Replacing:
         return list(filter(lambda replacement: replacement[1] == self.selected_meaning.gender,
                            self.replacement_words))
 
-    def should_not_replace(self, replacement_words) -> bool:  # TODO: Detecting acronyms (by large quantity of meanings?)
+    def should_not_replace(self, replacement_words) -> bool:
         """Checks various contitions, when given word should not be replaced"""
         word_in_ignored = self.selected_meaning.base_word in self.ignored_words  # TODO: Detect common bigrams "w ogóle"
         no_word_to_replace = len(replacement_words) == 0